@@ -216,6 +216,13 @@ if uploaded_videos:
     st.sidebar.header("Audio Volume Settings")
     original_volume = st.sidebar.slider("Original Video Audio Volume", 0.0, 1.0, 1.0, 0.05)
     bg_volume = st.sidebar.slider("Background Music Volume", 0.0, 1.0, 0.5, 0.05)
+    duck_background = st.sidebar.checkbox(
+        "Duck music under speech",
+        value=False,
+        help="Automatically lower the background music while the original audio is louder than the threshold."
+    )
+    duck_threshold = st.sidebar.slider("Ducking Threshold (dBFS)", -60.0, 0.0, -35.0, 1.0, disabled=not duck_background)
+    duck_level = st.sidebar.slider("Ducked Music Level", 0.0, 1.0, 0.25, 0.05, disabled=not duck_background)
 
     # Processing button
     submit = st.button("Start Processing", type="primary", disabled=st.session_state.processing_complete)
@@ -242,7 +249,10 @@ if uploaded_videos:
                     background_audio_path=audio_path,
                     output_path=output_path,
                     original_video_audio_volume=original_volume,
-                    background_music_volume=bg_volume
+                    background_music_volume=bg_volume,
+                    duck_background=duck_background,
+                    duck_threshold_db=duck_threshold,
+                    duck_gain=duck_level
                 )
 
                 if success:
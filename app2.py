@@ -1,76 +1,204 @@
 import streamlit as st
-import sys
-import subprocess
-from io import StringIO
-import contextlib
-import traceback
-import matplotlib.pyplot as plt
-from streamlit.components.v1 import html
+import os
+from kernel import KernelPool
+from notebook_graph import build_dependencies, run_fingerprint, stale_cells
+from output_store import OutputStore
+from package_installer import InstallManager, parse_requirements
+from mermaid_component import mermaid
 
 st.set_page_config(page_title="Jupyter-like Notebook", layout="wide")
 
+# Kernel settings: warm workers kept ready, CPU seconds per cell, memory per kernel (MB)
+KERNEL_POOL_SIZE = 2
+KERNEL_CPU_SECONDS = 300
+KERNEL_MEMORY_MB = 2048
+# Set to a directory to keep the full (untruncated) output of every cell on disk
+KERNEL_OUTPUT_SPILL_DIR = None
+# Figure format ('png' or 'svg') and the cap on cached figures/HTML per notebook
+FIGURE_FORMAT = 'png'
+RICH_OUTPUT_MAX_BYTES = 50 * 1024 * 1024
+# Local wheel cache shared by all sessions; installs are served from here first
+WHEELHOUSE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "notebook-wheelhouse")
+
+@st.cache_resource
+def get_kernel_pool():
+    """Warm kernel workers shared by all sessions"""
+    return KernelPool(
+        size=KERNEL_POOL_SIZE,
+        cpu_seconds=KERNEL_CPU_SECONDS,
+        memory_mb=KERNEL_MEMORY_MB,
+        spill_dir=KERNEL_OUTPUT_SPILL_DIR,
+        figure_format=FIGURE_FORMAT
+    )
+
+@st.cache_resource
+def get_install_manager():
+    """Background pip installer shared by all sessions"""
+    return InstallManager(WHEELHOUSE_DIR)
+
 # Initialize session state
 if 'cells' not in st.session_state:
     st.session_state.cells = [{'code': '', 'output': '', 'error': ''}]
-if 'namespace' not in st.session_state:
-    st.session_state.namespace = {}
+if 'kernel' not in st.session_state:
+    st.session_state.kernel = get_kernel_pool().acquire()
+if 'variables' not in st.session_state:
+    st.session_state.variables = {}
+if 'variable_sizes' not in st.session_state:
+    st.session_state.variable_sizes = {}
+if 'output_store' not in st.session_state:
+    st.session_state.output_store = OutputStore(max_bytes=RICH_OUTPUT_MAX_BYTES)
+if 'running_cell' not in st.session_state:
+    st.session_state.running_cell = None
 if 'installed_packages' not in st.session_state:
-    st.session_state.installed_packages = []
+    st.session_state.installed_packages = {}
+if 'install_jobs' not in st.session_state:
+    st.session_state.install_jobs = []
 
-def install_package(package_name):
-    """Install a package using pip"""
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
-        return True, f"Successfully installed {package_name}"
-    except subprocess.CalledProcessError as e:
-        return False, f"Failed to install {package_name}: {str(e)}"
+def record_install(job):
+    """Remember the versions a finished install job put in place"""
+    st.session_state.installed_packages.update(job.versions)
 
-def execute_code(code, namespace):
-    """Execute code and capture output, errors, and plots"""
-    output = StringIO()
-    error = ''
-    
+def new_kernel():
+    """Replace the session's kernel with a fresh one from the warm pool"""
+    st.session_state.kernel.shutdown()
+    st.session_state.kernel = get_kernel_pool().acquire()
+    st.session_state.variables = {}
+    st.session_state.variable_sizes = {}
+    st.session_state.running_cell = None
+
+def format_bytes(size):
+    """Human-readable byte count"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def store_result(idx, result):
+    """Copy a kernel result into a cell, record its fingerprint and refresh the variables panel"""
+    cells = st.session_state.cells
+    cell = cells[idx]
+    cell['output'] = result['output']
+    cell['error'] = result['error']
+    # Drop the previous full log of this cell, if one was spilled to disk
+    old_log = cell.get('log_path')
+    if old_log and old_log != result.get('log_path') and os.path.exists(old_log):
+        os.remove(old_log)
+    cell['truncated'] = result.get('truncated', False)
+    cell['log_path'] = result.get('log_path')
+    cell['profile'] = result.get('profile')
+    store = st.session_state.output_store
+    cell['outputs'] = [{'mime': item['mime'], 'key': store.add(item['mime'], item['data'])}
+                       for item in result.get('outputs', [])]
+    prune_outputs()
+    st.session_state.variables = result['variables']
+    if 'variable_sizes' in result:
+        st.session_state.variable_sizes = result['variable_sizes']
+    if result['error']:
+        cell.pop('fingerprint', None)
+    else:
+        cell['fingerprint'] = run_fingerprint(cells, idx, st.session_state.kernel.session_id)
+
+def prune_outputs():
+    """Drop cached rich outputs that no cell refers to any more"""
+    st.session_state.output_store.retain(
+        {ref['key'] for cell in st.session_state.cells for ref in cell.get('outputs', [])}
+    )
+
+def render_outputs(cell):
+    """Display a cell's figures and HTML from the output cache, without re-running it"""
+    for ref in cell.get('outputs', []):
+        item = st.session_state.output_store.get(ref['key'])
+        if item is None:
+            st.caption("Output no longer cached; re-run the cell to show it")
+            continue
+        mime, data = item
+        if mime == 'image/png':
+            st.image(data)
+        elif mime == 'image/svg+xml':
+            st.image(data.decode('utf-8'))
+        elif mime == 'text/html':
+            st.markdown(data.decode('utf-8'), unsafe_allow_html=True)
+
+def sync_cell_code():
+    """Pick up edits that have not been copied into the cells yet"""
+    for idx, cell in enumerate(st.session_state.cells):
+        cell['code'] = st.session_state.get(f"code_{idx}", cell['code'])
+
+def collect_pending():
+    """
+    Store the result of a run that an earlier script run stopped waiting for.
+
+    Any widget interaction while a cell runs makes Streamlit abandon the wait;
+    the cell keeps running in the kernel and its result is picked up here.
+    """
+    kernel = st.session_state.kernel
+    if not kernel.busy:
+        return
+    status = st.empty()
+    live_output = st.empty()
+    result = kernel.collect(
+        on_poll=lambda elapsed: status.caption(f"⏳ Finishing previous run... {elapsed:.0f}s"),
+        on_output=lambda text: live_output.code(text, language="text")
+    )
+    status.empty()
+    live_output.empty()
+    running = st.session_state.running_cell
+    st.session_state.running_cell = None
+    if result is not None and running is not None and running < len(st.session_state.cells):
+        store_result(running, result)
+
+def run_stale_cells():
+    """Re-run only cells whose code or upstream inputs changed, stopping at the first error"""
+    collect_pending()
+    sync_cell_code()
+    cells = st.session_state.cells
+    for idx in stale_cells(cells, st.session_state.kernel.session_id):
+        st.session_state.running_cell = idx
+        result = execute_code(cells[idx]['code'], st.session_state.kernel)
+        st.session_state.running_cell = None
+        if result is None:
+            break
+        store_result(idx, result)
+        if result['error']:
+            break
+
+def execute_code(code, kernel):
+    """Execute code in the session's kernel and capture output, errors, and plots"""
     # Check for pip install commands
     if code.strip().startswith('!pip install') or code.strip().startswith('pip install'):
-        package = code.replace('!pip install', '').replace('pip install', '').strip()
-        success, message = install_package(package)
-        if success:
-            st.session_state.installed_packages.append(package)
-        return message, '' if success else message
-    
-    try:
-        # Capture stdout
-        with contextlib.redirect_stdout(output):
-            # Try to get the result of the last expression
-            try:
-                # Split into statements
-                code_lines = code.strip().split('\n')
-                
-                # Execute all but last line
-                if len(code_lines) > 1:
-                    exec('\n'.join(code_lines[:-1]), namespace)
-                
-                # Try to eval the last line for display
-                last_line = code_lines[-1].strip()
-                if last_line and not last_line.startswith(('print', 'plt.', 'import', 'from', 'def', 'class', 'if', 'for', 'while', '=')):
-                    result = eval(last_line, namespace)
-                    if result is not None:
-                        print(result)
-                else:
-                    exec(last_line, namespace)
-            except SyntaxError:
-                # If eval fails, just exec everything
-                exec(code, namespace)
-            
-        # Check if matplotlib has any figures
-        if plt.get_fignums():
-            st.pyplot(plt.gcf())
-            plt.clf()
-            
-    except Exception as e:
-        error = f"Error: {type(e).__name__}\n{traceback.format_exc()}"
-    
-    return output.getvalue(), error
+        try:
+            requirements = parse_requirements(code.strip().lstrip('!')[len('pip install'):])
+        except ValueError as e:
+            requirements, message = [], str(e)
+        else:
+            message = "No packages to install"
+        if not requirements:
+            return {'output': '', 'error': message, 'outputs': [],
+                    'variables': st.session_state.variables}
+        job = get_install_manager().submit(requirements)
+        progress = st.empty()
+        while not job.wait(0.2):
+            progress.code("\n".join(list(job.log)[-20:]) or "Queued...", language="text")
+        progress.empty()
+        record_install(job)
+        log = "\n".join(job.log)
+        return {'output': f"{log}\n{job.message}", 'error': '' if job.success else job.message,
+                'outputs': [], 'variables': st.session_state.variables}
+
+    # Touch the page while waiting so Streamlit can stop this run (e.g. for Interrupt)
+    status = st.empty()
+    live_output = st.empty()
+    profile = st.session_state.get('profile_cells', False)
+    result = kernel.execute(
+        code,
+        on_poll=lambda elapsed: status.caption(f"⏳ Running... {elapsed:.0f}s"),
+        on_output=lambda text: live_output.code(text, language="text"),
+        profile=profile,
+        profile_top=st.session_state.get('profile_top', 0) if profile else 0
+    )
+    status.empty()
+    live_output.empty()
+    return result
 
 # Title and description
 st.title("🎯 Jupyter-like Notebook in Streamlit")
@@ -82,24 +210,85 @@ with st.sidebar:
     
     # Package installation section
     st.subheader("📦 Install Package")
-    package_name = st.text_input("Package name", placeholder="e.g., requests, beautifulsoup4")
+    package_name = st.text_input("Package name(s)", placeholder="e.g., requests, beautifulsoup4")
     if st.button("Install Package"):
-        if package_name:
-            with st.spinner(f"Installing {package_name}..."):
-                success, message = install_package(package_name)
-                if success:
-                    st.session_state.installed_packages.append(package_name)
-                    st.success(message)
-                else:
-                    st.error(message)
+        try:
+            requirements = parse_requirements(package_name)
+        except ValueError as e:
+            st.error(str(e))
+            requirements = []
+        if requirements:
+            st.session_state.install_jobs.append(get_install_manager().submit(requirements))
+
+    @st.fragment(run_every=1)
+    def install_status():
+        """Poll running install jobs without blocking the rest of the page"""
+        for job in list(st.session_state.install_jobs):
+            if job.done:
+                record_install(job)
+                st.session_state.install_jobs.remove(job)
+                st.session_state.install_messages = st.session_state.get('install_messages', []) + [
+                    (job.success, job.message)
+                ]
+            else:
+                st.info(f"Installing {', '.join(job.requirements)} ({job.status})...")
+                st.code("\n".join(list(job.log)[-10:]) or "Queued...", language="text")
+        if not st.session_state.install_jobs:
+            # Refresh the whole page so the installed list and messages update
+            st.rerun()
+
+    if st.session_state.install_jobs:
+        install_status()
+
+    for success, message in st.session_state.pop('install_messages', []):
+        if success:
+            st.success(message)
+        else:
+            st.error(message)
     
     if st.session_state.installed_packages:
         st.markdown("**Installed this session:**")
-        for pkg in st.session_state.installed_packages:
-            st.code(pkg)
+        for pkg, version in st.session_state.installed_packages.items():
+            st.code(f"{pkg}=={version}")
     
     st.markdown("---")
+
+    # Kernel controls
+    st.subheader("⚙️ Kernel")
+    kernel = st.session_state.kernel
+    if kernel.busy:
+        st.warning("Kernel is busy")
+    if st.button("⏹️ Interrupt"):
+        status = st.empty()
+        session_id = kernel.session_id
+        result = kernel.interrupt(on_poll=lambda elapsed: status.caption(f"⏳ Interrupting... {elapsed:.0f}s"))
+        status.empty()
+        if kernel.session_id != session_id:
+            # The cell ignored the interrupt and the kernel was restarted
+            st.session_state.variables = {}
+            st.session_state.variable_sizes = {}
+        running = st.session_state.running_cell
+        if result is not None and running is not None and running < len(st.session_state.cells):
+            store_result(running, result)
+        st.session_state.running_cell = None
+        st.rerun()
+    if st.button("♻️ Restart Kernel"):
+        new_kernel()
+        st.rerun()
+    profile_cells = st.checkbox(
+        "⏱️ Profile cells",
+        key="profile_cells",
+        help="Record time and memory allocation for each run (tracemalloc slows execution down)"
+    )
+    if profile_cells:
+        st.number_input("cProfile top N (0 = off)", min_value=0, max_value=50, value=0, key="profile_top")
+
+    st.markdown("---")
     
+    if st.button("⏩ Run Stale Cells", help="Re-run edited cells and the cells that depend on them"):
+        run_stale_cells()
+        st.rerun()
+
     if st.button("➕ Add Cell"):
         st.session_state.cells.append({'code': '', 'output': '', 'error': ''})
         st.rerun()
@@ -108,34 +297,51 @@ with st.sidebar:
         for cell in st.session_state.cells:
             cell['output'] = ''
             cell['error'] = ''
+            cell['truncated'] = False
+            cell['profile'] = None
+            cell['outputs'] = []
+        prune_outputs()
         st.rerun()
     
     if st.button("🗑️ Reset Notebook"):
         st.session_state.cells = [{'code': '', 'output': '', 'error': ''}]
-        st.session_state.namespace = {}
+        st.session_state.output_store.clear()
+        new_kernel()
         st.rerun()
     
     st.markdown("---")
     st.markdown("**Current Variables:**")
-    if st.session_state.namespace:
-        vars_to_show = {k: type(v).__name__ for k, v in st.session_state.namespace.items() 
-                       if not k.startswith('__') and not callable(v)}
-        for var, var_type in vars_to_show.items():
-            st.code(f"{var}: {var_type}", language="python")
+    if st.session_state.variables:
+        sizes = st.session_state.variable_sizes
+        for var, var_type in st.session_state.variables.items():
+            if var in sizes:
+                st.code(f"{var}: {var_type}  # ~{format_bytes(sizes[var])}", language="python")
+            else:
+                st.code(f"{var}: {var_type}", language="python")
     else:
         st.info("No variables yet")
 
 # Display cells
+collect_pending()
+sync_cell_code()
+stale = set(stale_cells(st.session_state.cells, st.session_state.kernel.session_id))
+dependencies = build_dependencies(st.session_state.cells)
 for idx, cell in enumerate(st.session_state.cells):
     col1, col2 = st.columns([20, 1])
     
     with col1:
-        st.markdown(f"**Cell [{idx + 1}]**")
+        header = f"**Cell [{idx + 1}]**"
+        if idx in stale and (cell['output'] or cell['error'] or 'fingerprint' in cell):
+            header += " · 🟡 stale"
+        if dependencies[idx]:
+            header += " · uses " + ", ".join(f"[{j + 1}]" for j in dependencies[idx])
+        st.markdown(header)
     
     with col2:
         if st.button("🗑️", key=f"delete_{idx}"):
             if len(st.session_state.cells) > 1:
                 st.session_state.cells.pop(idx)
+                prune_outputs()
                 st.rerun()
     
     # Code input
@@ -155,15 +361,21 @@ for idx, cell in enumerate(st.session_state.cells):
     with col_run:
         if st.button("▶️ Run", key=f"run_{idx}"):
             if code.strip():
-                output, error = execute_code(code, st.session_state.namespace)
-                cell['output'] = output
-                cell['error'] = error
+                st.session_state.running_cell = idx
+                result = execute_code(code, st.session_state.kernel)
+                st.session_state.running_cell = None
+                if result is not None:
+                    store_result(idx, result)
                 st.rerun()
     
     with col_clear:
         if st.button("Clear Output", key=f"clear_{idx}"):
             cell['output'] = ''
             cell['error'] = ''
+            cell['truncated'] = False
+            cell['profile'] = None
+            cell['outputs'] = []
+            prune_outputs()
             st.rerun()
     
     # Display output
@@ -171,6 +383,21 @@ for idx, cell in enumerate(st.session_state.cells):
         st.error(cell['error'])
     elif cell['output']:
         st.code(cell['output'], language="text")
+    render_outputs(cell)
+    if cell.get('profile'):
+        stats = cell['profile']
+        st.caption(
+            f"⏱️ wall {stats['wall_time']:.3f}s · CPU {stats['cpu_time']:.3f}s · "
+            f"peak {format_bytes(stats['peak_bytes'])} · net {format_bytes(stats['net_bytes'])}"
+        )
+        if stats.get('top'):
+            with st.expander("cProfile"):
+                st.table(stats['top'])
+    if cell.get('truncated'):
+        if cell.get('log_path'):
+            st.caption(f"Output truncated; full log saved to {cell['log_path']}")
+        else:
+            st.caption("Output truncated; the middle of the output was elided")
     
     st.markdown("---")
 
@@ -230,37 +457,22 @@ with st.expander("📚 Example Code Snippets"):
     ```
     """)
     
-if "svg_height" not in st.session_state:
-    st.session_state["svg_height"] = 200
 if "inpcode" not in st.session_state:
     st.session_state.inpcode = None
 
-vheight = st.number_input("Height", min_value=1, value=800)
-st.session_state.svg_height=vheight
 inpcode = st.text_area("Mermaid diagram")
 st.session_state.inpcode = f"""{inpcode}"""
-def mermaid(code: str) -> None:
-    html(
-        f"""
-        <pre class="mermaid">
-            {code}
-        </pre>
-
-        <script type="module">
-            import mermaid from 'https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.esm.min.mjs';
-            mermaid.initialize({{ startOnLoad: true }});
-        </script>
-        """,
-        height=st.session_state["svg_height"] + 800,
-    )
     
 code = """
     graph LR
         A --> B --> C
     """
 
+# Keep the diagram up across the rerun the component triggers when it returns SVGs
 if st.button("Show"):
-    if st.session_state.inpcode is not None:
-        mermaid(st.session_state.inpcode)
+    st.session_state.show_mermaid = True
+if st.session_state.get("show_mermaid"):
+    if st.session_state.inpcode:
+        mermaid(st.session_state.inpcode, key="notebook_mermaid")
     else:
-        mermaid(code)
+        mermaid(code, key="notebook_mermaid")
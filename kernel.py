@@ -0,0 +1,862 @@
+import os
+import sys
+import ast
+import hashlib
+import time
+import signal
+import threading
+import types
+import traceback
+import contextlib
+import multiprocessing
+import uuid
+import weakref
+import tempfile
+import tokenize
+from io import BytesIO, StringIO, TextIOBase
+from collections import OrderedDict, deque
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits
+    resource = None
+
+
+# Cell output kept in memory: the first HEAD and last TAIL characters
+OUTPUT_HEAD_CHARS = 10_000
+OUTPUT_TAIL_CHARS = 40_000
+# Minimum seconds between streamed output updates
+OUTPUT_FLUSH_INTERVAL = 0.25
+# Seconds an interrupted cell gets to stop before the kernel is restarted
+INTERRUPT_GRACE_SECONDS = 3.0
+
+
+class CPULimitExceeded(Exception):
+    """Raised inside the worker when a cell uses more CPU time than allowed"""
+
+
+def _raise_cpu_limit(signum, frame):
+    raise CPULimitExceeded("Cell exceeded its CPU time limit")
+
+
+def _apply_memory_limit(memory_mb):
+    """Cap the worker's address space so a runaway cell gets a MemoryError"""
+    if resource is None or not memory_mb:
+        return
+    limit = int(memory_mb) * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):
+        pass
+
+
+@contextlib.contextmanager
+def _cpu_limit(cpu_seconds):
+    """Allow the enclosed block at most cpu_seconds of CPU time (soft RLIMIT_CPU)"""
+    if resource is None or not cpu_seconds or not hasattr(signal, "SIGXCPU"):
+        yield
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (used + int(cpu_seconds), hard))
+    except (ValueError, OSError):
+        yield
+        return
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def _list_variables(namespace):
+    """Summarise user variables as {name: type name}"""
+    return {k: type(v).__name__ for k, v in namespace.items()
+            if not k.startswith('__') and not callable(v)}
+
+
+def _approx_size(obj, _seen=None, _depth=0, max_depth=4, max_items=1000):
+    """
+    Approximate deep size of an object in bytes.
+
+    Arrays and frames report their buffers via nbytes / memory_usage(deep=True).
+    Containers are walked to max_depth; for large ones only the first max_items
+    elements are measured and the rest extrapolated.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    if type(obj).__module__.startswith('pandas') and hasattr(obj, 'memory_usage'):
+        try:
+            usage = obj.memory_usage(deep=True)
+            return int(usage.sum() if hasattr(usage, 'sum') else usage)
+        except Exception:
+            pass
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    size = sys.getsizeof(obj, 0)
+    if _depth >= max_depth:
+        return size
+
+    if isinstance(obj, dict):
+        items = obj.items()
+        count = len(obj)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = obj
+        count = len(obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, (type, types.ModuleType)):
+        return size + _approx_size(vars(obj), _seen, _depth + 1, max_depth, max_items)
+    else:
+        return size
+
+    measured = 0
+    sampled = 0
+    for item in items:
+        if sampled >= max_items:
+            break
+        if isinstance(obj, dict):
+            key, value = item
+            measured += _approx_size(key, _seen, _depth + 1, max_depth, max_items)
+            measured += _approx_size(value, _seen, _depth + 1, max_depth, max_items)
+        else:
+            measured += _approx_size(item, _seen, _depth + 1, max_depth, max_items)
+        sampled += 1
+    if sampled and count > sampled:
+        measured = measured * count // sampled
+    return size + measured
+
+
+# Last measured size per variable: name -> (id of object, size in bytes)
+_SIZE_CACHE = {}
+
+
+def _variable_sizes(namespace, touched):
+    """
+    Approximate sizes of user variables, reusing cached sizes where possible.
+
+    A size is only recomputed when the name was touched by the last cell
+    (defined or referenced in its code) or now points to a different object.
+    """
+    sizes = {}
+    for name, value in namespace.items():
+        if name.startswith('__') or callable(value):
+            continue
+        cached = _SIZE_CACHE.get(name)
+        if cached is None or cached[0] != id(value) or name in touched:
+            try:
+                cached = (id(value), _approx_size(value))
+            except Exception:
+                cached = (id(value), sys.getsizeof(value, 0))
+            _SIZE_CACHE[name] = cached
+        sizes[name] = cached[1]
+    for name in list(_SIZE_CACHE):
+        if name not in sizes:
+            del _SIZE_CACHE[name]
+    return sizes
+
+
+def _touched_names(code):
+    """Global names a cell defines or reads, according to notebook_graph"""
+    try:
+        from notebook_graph import analyze_cell
+    except ImportError:
+        return None
+    defined, used = analyze_cell(code)
+    return defined | used
+
+
+# Builtins the kernel itself calls to run a cell
+_KERNEL_BUILTINS = {"<built-in method builtins.exec>", "<built-in method builtins.eval>"}
+
+
+def _kernel_functions(stats):
+    """
+    pstats keys of the kernel's own functions and of everything only they call.
+
+    Covers e.g. the output throttle's threading.Timer calls, but not the cell code
+    run through exec/eval. Entry points other than exec/eval (the profiler being
+    switched off on the way out) count as the kernel's too.
+    """
+    kernel = {func for func, (_, _, _, _, callers) in stats.items()
+              if func[0] == __file__ or (not callers and func[2] not in _KERNEL_BUILTINS)}
+    changed = True
+    while changed:
+        changed = False
+        for func, (_, _, _, _, callers) in stats.items():
+            if func in kernel or func[2] in _KERNEL_BUILTINS:
+                continue
+            if all(caller in kernel for caller in callers):
+                kernel.add(func)
+                changed = True
+    return kernel
+
+
+@contextlib.contextmanager
+def _profiled(enabled, top_n, kernel_bytes=None):
+    """
+    Measure wall/CPU time and tracemalloc peak/net allocation of the enclosed block.
+
+    Yields a dict that is filled in on exit (empty if profiling is disabled). With
+    top_n > 0, the block also runs under cProfile and the top_n functions by
+    cumulative time are reported. kernel_bytes, if given, returns the memory the
+    kernel itself still holds from the block (e.g. captured output), which is
+    left out of the allocation figures.
+    """
+    stats = {}
+    if not enabled:
+        yield stats
+        return
+
+    import tracemalloc
+    profiler = None
+    if top_n:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield stats
+    finally:
+        if profiler:
+            profiler.disable()
+        stats['wall_time'] = time.perf_counter() - wall_start
+        stats['cpu_time'] = time.process_time() - cpu_start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        overhead = kernel_bytes() if kernel_bytes else 0
+        stats['net_bytes'] = max(current - overhead, 0)
+        stats['peak_bytes'] = max(peak - overhead, stats['net_bytes'])
+        if profiler:
+            import pstats
+            ps = pstats.Stats(profiler)
+            # Leave out the kernel's own wrappers and output handling so the table shows the user's code
+            kernel = _kernel_functions(ps.stats)
+            rows = []
+            for func, (cc, nc, tt, ct, _) in ps.stats.items():
+                filename, line, name = func
+                if func in kernel or name in _KERNEL_BUILTINS:
+                    continue
+                rows.append({
+                    'function': f"{name} ({os.path.basename(filename)}:{line})" if line else name,
+                    'ncalls': nc,
+                    'tottime': round(tt, 6),
+                    'cumtime': round(ct, 6),
+                })
+            rows.sort(key=lambda row: row['cumtime'], reverse=True)
+            stats['top'] = rows[:top_n]
+
+
+_FIGURE_MIME_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def _collect_figures(figure_format='png'):
+    """Render any open matplotlib figures to PNG/SVG bytes and close them"""
+    if 'matplotlib.pyplot' not in sys.modules:
+        return []
+    plt = sys.modules['matplotlib.pyplot']
+    options = {}
+    if figure_format == 'svg':
+        # No timestamp and fixed element ids, so identical figures give identical bytes
+        options['metadata'] = {'Date': None}
+    figures = []
+    for num in plt.get_fignums():
+        buf = BytesIO()
+        with plt.rc_context({'svg.hashsalt': 'notebook'}):
+            plt.figure(num).savefig(buf, format=figure_format, bbox_inches='tight', **options)
+        figures.append({'mime': _FIGURE_MIME_TYPES[figure_format], 'data': buf.getvalue()})
+    plt.close('all')
+    return figures
+
+
+# Compiled cells keyed by code hash, most recently used last
+_CODE_CACHE = OrderedDict()
+_CODE_CACHE_SIZE = 256
+
+
+_IGNORED_TOKENS = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT,
+                   tokenize.DEDENT, tokenize.ENDMARKER}
+
+
+def _ends_with_semicolon(code):
+    """True if the last real token of the cell (ignoring comments) is `;`"""
+    last = None
+    try:
+        for token in tokenize.generate_tokens(StringIO(code).readline):
+            if token.type not in _IGNORED_TOKENS:
+                last = token
+    except (tokenize.TokenError, SyntaxError):
+        return False
+    return last is not None and last.type == tokenize.OP and last.string == ';'
+
+
+def _compile_cell(code):
+    """
+    Parse a cell once and compile it, splitting off a trailing expression for display.
+
+    Returns:
+        tuple: (body code object, trailing expression code object or None)
+    """
+    key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+    cached = _CODE_CACHE.get(key)
+    if cached is not None:
+        _CODE_CACHE.move_to_end(key)
+        return cached
+
+    tree = ast.parse(code, filename='<cell>', mode='exec')
+    expr = None
+    # A trailing `;` suppresses display, as in Jupyter
+    if tree.body and isinstance(tree.body[-1], ast.Expr) and not _ends_with_semicolon(code):
+        expr = ast.Expression(tree.body.pop().value)
+        expr = compile(expr, '<cell>', 'eval', dont_inherit=True)
+    body = compile(tree, '<cell>', 'exec', dont_inherit=True)
+
+    _CODE_CACHE[key] = (body, expr)
+    if len(_CODE_CACHE) > _CODE_CACHE_SIZE:
+        _CODE_CACHE.popitem(last=False)
+    return body, expr
+
+
+def _run_cell(compiled, namespace, display=print):
+    """Execute a cell compiled by _compile_cell, passing the value of a trailing expression to display"""
+    body, expr = compiled
+    exec(body, namespace)
+    if expr is not None:
+        result = eval(expr, namespace)
+        if result is not None:
+            display(result)
+
+
+def _rich_display(outputs):
+    """Build a display function that keeps HTML reprs (e.g. DataFrames) and prints the rest"""
+    def display(value):
+        repr_html = getattr(value, '_repr_html_', None)
+        if callable(repr_html):
+            try:
+                html = repr_html()
+            except Exception:
+                html = None
+            if html:
+                outputs.append({'mime': 'text/html', 'data': html.encode('utf-8')})
+                return
+        print(value)
+    return display
+
+
+class _BoundedOutput(TextIOBase):
+    """
+    stdout replacement that keeps only the head and tail of a cell's output.
+
+    The middle is elided once the limits are reached. Snapshots are passed to
+    on_flush at most every flush_interval seconds; output held back by the
+    throttle is flushed by a timer, so a print followed by a long computation
+    still shows up. The complete output can optionally be written to a log file
+    in spill_dir.
+    """
+
+    def __init__(self, head_chars, tail_chars, on_flush=None,
+                 flush_interval=OUTPUT_FLUSH_INTERVAL, spill_dir=None):
+        self.head_chars = head_chars
+        self.tail_chars = tail_chars
+        self.on_flush = on_flush
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+        self.log_path = None
+        self._log = None
+        self._head = []
+        self._head_len = 0
+        self._tail = deque()
+        self._tail_len = 0
+        self.elided = 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self._lock:
+            if self.spill_dir is not None:
+                if self._log is None:
+                    self._log = tempfile.NamedTemporaryFile(
+                        'w', dir=self.spill_dir, prefix='cell-', suffix='.log',
+                        delete=False, encoding='utf-8')
+                    self.log_path = self._log.name
+                self._log.write(text)
+
+            rest = text
+            if self._head_len < self.head_chars:
+                taken = rest[:self.head_chars - self._head_len]
+                self._head.append(taken)
+                self._head_len += len(taken)
+                rest = rest[len(taken):]
+            if rest:
+                self._tail.append(rest)
+                self._tail_len += len(rest)
+                while self._tail_len > self.tail_chars:
+                    excess = self._tail_len - self.tail_chars
+                    first = self._tail[0]
+                    if len(first) <= excess:
+                        self._tail.popleft()
+                        dropped = len(first)
+                    else:
+                        self._tail[0] = first[excess:]
+                        dropped = excess
+                    self._tail_len -= dropped
+                    self.elided += dropped
+            self._dirty = True
+        self._maybe_flush()
+        return len(text)
+
+    def buffer_bytes(self):
+        """Approximate memory held by the kept head and tail"""
+        with self._lock:
+            return (sys.getsizeof(self._head) + sum(sys.getsizeof(part) for part in self._head)
+                    + sys.getsizeof(self._tail) + sum(sys.getsizeof(part) for part in self._tail))
+
+    def getvalue(self):
+        with self._lock:
+            parts = self._head[:]
+            if self.elided:
+                parts.append(f"\n... [{self.elided} characters elided] ...\n")
+            parts.extend(self._tail)
+        return ''.join(parts)
+
+    def _maybe_flush(self, force=False):
+        if self.on_flush is None:
+            return
+        with self._flush_lock:
+            if not self._dirty or self._closed:
+                return
+            wait = self.flush_interval - (time.monotonic() - self._last_flush)
+            if not force and wait > 0:
+                # Throttled: make sure the held-back output goes out once the interval ends
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self._trailing_flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self._dirty = False
+            self._last_flush = time.monotonic()
+            self.on_flush(self.getvalue())
+
+    def _trailing_flush(self):
+        with self._flush_lock:
+            self._timer = None
+        self._maybe_flush()
+
+    def flush(self):
+        self._maybe_flush()
+
+    def close(self):
+        # The final output travels with the result; no snapshot may follow it
+        with self._flush_lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        super().close()
+
+
+def _execute(code, namespace, options, send=None, profile=False, profile_top=0, reply=None):
+    """
+    Run one cell in the worker and build the result sent back to the app.
+
+    Once the cell body has finished, SIGINT stays blocked until the result has
+    been handed to reply, so a late interrupt cannot lose it.
+    """
+    import importlib
+    # Pick up packages installed since the worker started
+    importlib.invalidate_caches()
+
+    output = _BoundedOutput(
+        options['output_head_chars'],
+        options['output_tail_chars'],
+        on_flush=(lambda text: send(('stream', text))) if send else None,
+        spill_dir=options['spill_dir']
+    )
+    error = ''
+    stats = {}
+    outputs = []
+    try:
+        with contextlib.redirect_stdout(output), _cpu_limit(options['cpu_seconds']):
+            # Compile outside the profiled region so parsing does not show up in the stats
+            compiled = _compile_cell(code)
+            with _profiled(profile, profile_top, kernel_bytes=output.buffer_bytes) as stats:
+                _run_cell(compiled, namespace, _rich_display(outputs))
+    except KeyboardInterrupt:
+        error = "Error: KeyboardInterrupt\nExecution interrupted"
+    except BaseException as e:
+        error = f"Error: {type(e).__name__}\n{traceback.format_exc()}"
+
+    with _sigint_blocked():
+        output.close()
+        try:
+            outputs.extend(_collect_figures(options['figure_format']))
+        except Exception:
+            pass
+
+        touched = _touched_names(code)
+        if touched is None:
+            # Without the analysis, treat every variable as possibly changed
+            touched = set(namespace)
+
+        result = {
+            'output': output.getvalue(),
+            'error': error,
+            'outputs': outputs,
+            'variables': _list_variables(namespace),
+            'truncated': output.elided > 0,
+            'log_path': output.log_path,
+            'profile': stats or None,
+            'variable_sizes': _variable_sizes(namespace, touched),
+        }
+        if reply:
+            reply(result)
+    return result
+
+
+@contextlib.contextmanager
+def _sigint_blocked():
+    """Hold back SIGINT so a late interrupt cannot cut a reply in half"""
+    if not hasattr(signal, "pthread_sigmask"):
+        yield
+        return
+    # Restore the previous mask rather than unblocking, so nested blocks stay blocked
+    previous = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGINT})
+    try:
+        yield
+    finally:
+        signal.pthread_sigmask(signal.SIG_SETMASK, previous)
+
+
+def _worker_main(conn, options):
+    """Entry point of the kernel subprocess; keeps a persistent namespace"""
+    # Warm up the imports every cell would otherwise pay for
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot  # noqa: F401
+    except ImportError:
+        pass
+
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+    _apply_memory_limit(options['memory_mb'])
+
+    # Cell threads may print concurrently; only one message may be on the pipe at a time
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock, _sigint_blocked():
+            conn.send(message)
+
+    namespace = {'__name__': '__main__'}
+    replied = []
+
+    def reply(result):
+        with _sigint_blocked():
+            send(('result', result))
+            replied.append(True)
+
+    while True:
+        try:
+            kind, payload = conn.recv()
+        except KeyboardInterrupt:
+            # Interrupt arrived after the cell already finished
+            continue
+        except (EOFError, OSError):
+            break
+
+        if kind == 'execute':
+            replied.clear()
+            try:
+                _execute(payload['code'], namespace, options, send,
+                         payload['profile'], payload['profile_top'], reply)
+            except KeyboardInterrupt:
+                # A late interrupt slipped in after the cell body; still answer exactly once
+                if not replied:
+                    try:
+                        reply({
+                            'output': '',
+                            'error': "Error: KeyboardInterrupt\nExecution interrupted",
+                            'outputs': [],
+                            'variables': _list_variables(namespace),
+                            'truncated': False,
+                            'log_path': None,
+                            'profile': None,
+                        })
+                    except KeyboardInterrupt:
+                        pass
+        elif kind == 'shutdown':
+            break
+
+
+def _stop_process(process, conn):
+    """Terminate a worker process and close its pipe"""
+    try:
+        conn.close()
+    except OSError:
+        pass
+    if process.is_alive():
+        process.terminate()
+        process.join(timeout=2)
+        if process.is_alive():
+            process.kill()
+
+
+def _restarted_result(error):
+    """Result dict for a run whose kernel had to be restarted"""
+    return {
+        'output': '',
+        'error': error,
+        'outputs': [],
+        'variables': {},
+        'truncated': False,
+        'log_path': None,
+        'profile': None,
+        'variable_sizes': {},
+    }
+
+
+class NotebookKernel:
+    """
+    A notebook kernel running in its own subprocess.
+
+    The worker keeps a persistent namespace across cells. Cells are sent over a
+    pipe and results come back as dicts with 'output', 'error', 'outputs' (rich
+    outputs: figures as PNG/SVG and HTML reprs) and 'variables'. Optional CPU
+    (seconds per cell) and memory (MB) limits are enforced in the worker with
+    rlimits where the platform supports them.
+
+    While a cell runs, its stdout is streamed back as bounded snapshots (head
+    and tail, middle elided). With spill_dir set, the full output of each cell
+    is also written to a log file there.
+    """
+
+    def __init__(self, cpu_seconds=None, memory_mb=None, output_head_chars=OUTPUT_HEAD_CHARS,
+                 output_tail_chars=OUTPUT_TAIL_CHARS, spill_dir=None, figure_format='png'):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.output_head_chars = output_head_chars
+        self.output_tail_chars = output_tail_chars
+        self.spill_dir = spill_dir
+        if figure_format not in _FIGURE_MIME_TYPES:
+            raise ValueError(f"Unsupported figure format: {figure_format}")
+        self.figure_format = figure_format
+        self._ctx = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._pending = False
+        self._finalizer = None
+        self.session_id = None
+
+    def start(self):
+        """Start the worker subprocess (returns immediately)"""
+        parent_conn, child_conn = self._ctx.Pipe()
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, {
+                'cpu_seconds': self.cpu_seconds,
+                'memory_mb': self.memory_mb,
+                'output_head_chars': self.output_head_chars,
+                'output_tail_chars': self.output_tail_chars,
+                'spill_dir': self.spill_dir,
+                'figure_format': self.figure_format,
+            }),
+            daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._pending = False
+        # Changes on every (re)start, so state tied to the old namespace can be invalidated
+        self.session_id = uuid.uuid4().hex
+        self._finalizer = weakref.finalize(self, _stop_process, self._process, self._conn)
+        return self
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    @property
+    def busy(self):
+        """True while a cell is running (or its result has not been collected)"""
+        return self._pending
+
+    def _wait_for_result(self, on_poll=None, on_output=None, poll_interval=0.1, timeout=None):
+        """
+        Block until the worker answers, calling on_poll between polls and on_output for streamed output.
+
+        Returns None if another caller collected the result, or if timeout seconds
+        passed first (the run is then still pending).
+        """
+        started = time.monotonic()
+        # A restart from another thread replaces (and closes) the connection
+        conn = self._conn
+        while self._pending and conn is self._conn:
+            try:
+                if conn.poll(poll_interval):
+                    kind, payload = conn.recv()
+                    if kind == 'result':
+                        self._pending = False
+                        return payload
+                    if on_output:
+                        on_output(payload)
+                    continue
+            except (EOFError, OSError):
+                pass
+            if not self.is_alive():
+                code = self._process.exitcode
+                self.restart()
+                return _restarted_result(
+                    f"Error: KernelDied\nThe kernel process exited (code {code}) and was restarted. "
+                    "All variables were lost."
+                )
+            elapsed = time.monotonic() - started
+            if timeout is not None and elapsed >= timeout:
+                return None
+            if on_poll:
+                on_poll(elapsed)
+        # Another caller (e.g. interrupt) collected the result
+        return None
+
+    def execute(self, code, on_poll=None, on_output=None, profile=False, profile_top=0):
+        """
+        Run code in the worker and return its result dict.
+
+        Args:
+            code (str): Source of the cell
+            on_poll (callable, optional): Called with the elapsed seconds while waiting
+            on_output (callable, optional): Called with a snapshot of the output so far
+            profile (bool): Record wall/CPU time and tracemalloc peak/net allocation
+            profile_top (int): If > 0, also run under cProfile and report the top N functions
+
+        Returns:
+            dict: 'output', 'error', 'outputs' ({'mime', 'data'} dicts), 'variables', 'variable_sizes',
+            'truncated', 'log_path' and 'profile', or None if the result was collected
+            by interrupt() instead
+        """
+        if not self.is_alive():
+            self.restart()
+        if self._pending:
+            # A previous run was abandoned; collect its result first
+            self._wait_for_result(on_poll)
+        self._conn.send(('execute', {'code': code, 'profile': profile, 'profile_top': profile_top}))
+        self._pending = True
+        return self._wait_for_result(on_poll, on_output)
+
+    def collect(self, on_poll=None, on_output=None):
+        """
+        Wait for the result of a run whose caller stopped waiting for it.
+
+        Returns:
+            dict or None: Result of the abandoned run, or None if nothing was pending
+        """
+        if not self._pending:
+            return None
+        return self._wait_for_result(on_poll, on_output)
+
+    def interrupt(self, on_poll=None, grace_seconds=INTERRUPT_GRACE_SECONDS):
+        """
+        Interrupt the running cell.
+
+        A cell stuck in C code may not notice SIGINT; if the worker has not answered
+        within grace_seconds it is restarted instead.
+
+        Args:
+            on_poll (callable, optional): Called with the elapsed seconds while waiting
+            grace_seconds (float): How long to wait for the interrupted cell to stop
+
+        Returns:
+            dict or None: Result of the interrupted cell, or None if nothing was running
+        """
+        if not self._pending or not self.is_alive():
+            return None
+        if os.name == 'nt':
+            # No way to deliver SIGINT to a child on Windows; start over instead
+            self.restart()
+            return None
+        os.kill(self._process.pid, signal.SIGINT)
+        result = self._wait_for_result(on_poll, timeout=grace_seconds)
+        if result is None and self._pending:
+            self.restart()
+            return _restarted_result(
+                f"Error: KeyboardInterrupt\nThe cell did not stop within {grace_seconds:g}s of the "
+                "interrupt, so the kernel was restarted. All variables were lost."
+            )
+        return result
+
+    def restart(self):
+        """Kill the worker and start a fresh one with an empty namespace"""
+        self.shutdown()
+        return self.start()
+
+    def shutdown(self):
+        if self._finalizer is not None:
+            self._finalizer()
+            self._finalizer = None
+        self._process = None
+        self._conn = None
+        self._pending = False
+
+
+class KernelPool:
+    """
+    Keeps a few kernels started ahead of time so new sessions get a warm worker.
+
+    Kernels handed out by acquire() belong to the caller; the pool immediately
+    starts a replacement in the background. Extra keyword arguments are passed
+    to NotebookKernel.
+    """
+
+    def __init__(self, size=2, **kernel_options):
+        self.size = size
+        self.kernel_options = kernel_options
+        self._lock = threading.Lock()
+        self._idle = []
+        self._fill()
+
+    def _new_kernel(self):
+        return NotebookKernel(**self.kernel_options).start()
+
+    def _fill(self):
+        with self._lock:
+            self._idle = [k for k in self._idle if k.is_alive()]
+            while len(self._idle) < self.size:
+                self._idle.append(self._new_kernel())
+
+    def acquire(self):
+        """Take a warm kernel from the pool (or start one if the pool is empty)"""
+        with self._lock:
+            kernel = None
+            while self._idle and kernel is None:
+                candidate = self._idle.pop(0)
+                if candidate.is_alive():
+                    kernel = candidate
+        if kernel is None:
+            kernel = self._new_kernel()
+        threading.Thread(target=self._fill, daemon=True).start()
+        return kernel
+
+    def shutdown(self):
+        with self._lock:
+            for kernel in self._idle:
+                kernel.shutdown()
+            self._idle = []
@@ -1,17 +1,108 @@
 from moviepy import VideoFileClip, AudioFileClip, CompositeAudioClip
 import os
 import argparse # Import argparse
+import numpy as np
+
+def compute_ducking_gain(
+    audio_clip,
+    threshold_db=-35.0,
+    duck_gain=0.25,
+    attack=0.05,
+    release=0.5,
+    block_duration=0.01,
+    chunk_duration=2.0
+):
+    """
+    Computes a sidechain ducking gain curve from the envelope of an audio clip.
+
+    The clip is read in chunks of `chunk_duration` seconds, so memory stays bounded
+    on long inputs. Each chunk is split into blocks of `block_duration` seconds and
+    the block RMS level is computed with NumPy. Blocks louder than `threshold_db`
+    (dBFS) target `duck_gain`, quieter blocks target 1.0, and the target is smoothed
+    with separate attack/release time constants.
+
+    Args:
+        audio_clip: MoviePy audio clip to follow (e.g. the original video audio)
+        threshold_db (float): RMS level in dBFS above which the bed is ducked
+        duck_gain (float): Gain applied to the bed while ducked (0.0 - 1.0)
+        attack (float): Time constant in seconds for ducking down
+        release (float): Time constant in seconds for coming back up
+        block_duration (float): Envelope resolution in seconds
+        chunk_duration (float): Length of each analysis chunk in seconds
+
+    Returns:
+        tuple: (block_times: np.ndarray, gains: np.ndarray) for use with apply_ducking
+    """
+    fps = audio_clip.fps
+    duration = audio_clip.duration
+    block_size = max(1, int(round(block_duration * fps)))
+    blocks_per_chunk = max(1, int(chunk_duration / block_duration))
+    chunk_samples = block_size * blocks_per_chunk
+    total_samples = int(duration * fps)
+    threshold_power = 10.0 ** (threshold_db / 10.0)
+
+    attack_coef = np.exp(-block_duration / attack) if attack > 0 else 0.0
+    release_coef = np.exp(-block_duration / release) if release > 0 else 0.0
+
+    gains = []
+    current = 1.0
+    for start in range(0, total_samples, chunk_samples):
+        stop = min(start + chunk_samples, total_samples)
+        t = np.arange(start, stop) / fps
+        frames = np.asarray(audio_clip.get_frame(t), dtype=np.float32)
+        power = frames ** 2 if frames.ndim == 1 else np.mean(frames ** 2, axis=1)
+
+        # Pad the last chunk to a whole number of blocks
+        pad = (-len(power)) % block_size
+        if pad:
+            power = np.concatenate([power, np.zeros(pad, dtype=power.dtype)])
+        block_power = power.reshape(-1, block_size).mean(axis=1)
+        targets = np.where(block_power > threshold_power, duck_gain, 1.0)
+
+        # One-pole smoothing runs on the decimated block envelope, not per sample
+        smoothed = np.empty(len(targets))
+        for i, target in enumerate(targets):
+            coef = attack_coef if target < current else release_coef
+            current = target + coef * (current - target)
+            smoothed[i] = current
+        gains.append(smoothed)
+
+    gains = np.concatenate(gains) if gains else np.ones(1)
+    block_times = (np.arange(len(gains)) + 0.5) * block_size / fps
+    return block_times, gains
+
+def apply_ducking(bed_clip, block_times, gains):
+    """
+    Applies a gain curve from compute_ducking_gain to a background audio clip.
+
+    The gain is interpolated at the requested sample times, so it is applied in the
+    same vectorized pass that renders the final mix.
+    """
+    def duck(get_frame, t):
+        frame = get_frame(t)
+        gain = np.interp(t, block_times, gains)
+        if np.ndim(frame) > np.ndim(gain):
+            gain = np.expand_dims(gain, -1)
+        return frame * gain
+
+    return bed_clip.transform(duck, keep_duration=True)
 
 def combine_video_with_audio_control(
     video_path,
     background_audio_path,
     output_path,
     original_video_audio_volume=1.0,
-    background_music_volume=0.5
+    background_music_volume=0.5,
+    duck_background=False,
+    duck_threshold_db=-35.0,
+    duck_gain=0.25,
+    duck_attack=0.05,
+    duck_release=0.5
 ):
     """
     Combines a video with background audio, allowing volume adjustment for both.
-    (Function content remains the same as before)
+    If duck_background is set, the background music is automatically lowered to
+    duck_gain while the original audio is louder than duck_threshold_db.
     """
     if not os.path.exists(video_path):
         print(f"Error: Video file not found at '{video_path}'")
@@ -65,6 +156,17 @@ def combine_video_with_audio_control(
             # Use with_volume_scaled() instead of volumex()
             original_audio = video_clip.audio.with_volume_scaled(original_video_audio_volume)
             audio_tracks_to_combine.append(original_audio)
+
+            if duck_background:
+                print(f"Ducking background music to {duck_gain*100}% above {duck_threshold_db} dBFS...")
+                block_times, gains = compute_ducking_gain(
+                    video_clip.audio,
+                    threshold_db=duck_threshold_db,
+                    duck_gain=duck_gain,
+                    attack=duck_attack,
+                    release=duck_release
+                )
+                bg_music_final = apply_ducking(bg_music_final, block_times, gains)
         else:
             print("Original video has no audio track.")
 
@@ -132,6 +234,23 @@ if __name__ == "__main__":
         default=0.5,
         help="Volume multiplier for the background music (e.g., 0.5 for 50%%, 1.0 for 100%%). Default: 0.5"
     )
+    parser.add_argument(
+        "--duck",
+        action='store_true',
+        help="If set, automatically lowers the background music while the original audio is speaking."
+    )
+    parser.add_argument(
+        "--duck_threshold",
+        type=float,
+        default=-35.0,
+        help="Original audio level in dBFS above which the background music is ducked. Default: -35.0"
+    )
+    parser.add_argument(
+        "--duck_level",
+        type=float,
+        default=0.25,
+        help="Volume multiplier applied to the background music while ducked. Default: 0.25"
+    )
     parser.add_argument(
         "--create_dummy_files",
         action='store_true', # This makes it a flag, no value needed after it
@@ -191,7 +310,10 @@ if __name__ == "__main__":
             background_audio_path=args.background_audio_path,
             output_path=args.output_path,
             original_video_audio_volume=args.original_volume,
-            background_music_volume=args.bg_volume
+            background_music_volume=args.bg_volume,
+            duck_background=args.duck,
+            duck_threshold_db=args.duck_threshold,
+            duck_gain=args.duck_level
         )
         if success:
             print(f"Successfully created: {args.output_path}")
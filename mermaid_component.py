@@ -0,0 +1,58 @@
+import os
+import hashlib
+import textwrap
+from collections import OrderedDict
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mermaid_frontend")
+MERMAID_BUNDLE = os.path.join(_FRONTEND_DIR, "mermaid.min.js")
+
+# Rendered SVGs kept per session
+SVG_CACHE_SIZE = 128
+
+_component = components.declare_component("mermaid", path=_FRONTEND_DIR)
+
+
+def _diagram_key(code, theme):
+    return hashlib.sha256(f"{theme}\n{code}".encode("utf-8")).hexdigest()
+
+
+def mermaid(diagrams, theme="default", key=None):
+    """
+    Render one or more Mermaid diagrams in a single iframe.
+
+    Mermaid is loaded from the vendored bundle in mermaid_frontend/, so no
+    network access is needed and the browser caches it; if the bundle has not
+    been vendored, the same pinned release is loaded from the CDN. Rendered
+    SVGs are sent back and cached in the session by a hash of the diagram source, so later
+    reruns only re-insert the SVG. The iframe sizes itself to its content.
+
+    Args:
+        diagrams (str or list): Mermaid source, or a list of sources
+        theme (str): Mermaid theme name
+        key (str, optional): Widget key; keep it stable to reuse the iframe
+    """
+    if isinstance(diagrams, str):
+        diagrams = [diagrams]
+
+    if "mermaid_svgs" not in st.session_state:
+        st.session_state.mermaid_svgs = OrderedDict()
+    cache = st.session_state.mermaid_svgs
+
+    items = []
+    for code in diagrams:
+        code = textwrap.dedent(code).strip()
+        digest = _diagram_key(code, theme)
+        svg = cache.get(digest)
+        if svg is not None:
+            cache.move_to_end(digest)
+        items.append({"key": digest, "code": code, "svg": svg})
+
+    rendered = _component(diagrams=items, theme=theme, key=key, default=None)
+    if rendered:
+        for digest, svg in rendered.items():
+            cache[digest] = svg
+        while len(cache) > SVG_CACHE_SIZE:
+            cache.popitem(last=False)
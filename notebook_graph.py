@@ -0,0 +1,240 @@
+import ast
+import hashlib
+from functools import lru_cache
+
+
+class _NameVisitor(ast.NodeVisitor):
+    """
+    Collect the global names a statement reads (loads) and binds (stores).
+
+    display marks a cell's trailing expression, whose value is shown.
+    """
+
+    def __init__(self, display=False):
+        self.display = display
+        self.loads = set()
+        self.stores = set()
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.loads.add(node.id)
+        else:
+            self.stores.add(node.id)
+
+    def visit_AugAssign(self, node):
+        # `x += 1` reads x as well as rebinding it
+        if isinstance(node.target, ast.Name):
+            self.loads.add(node.target.id)
+        self.generic_visit(node)
+
+    def _visit_mutation(self, node):
+        # `df['x'] = ...` / `obj.attr = ...` both reads and changes the base object
+        if isinstance(node.ctx, (ast.Store, ast.Del)):
+            base = node.value
+            while isinstance(base, (ast.Attribute, ast.Subscript)):
+                base = base.value
+            if isinstance(base, ast.Name):
+                self.stores.add(base.id)
+        self.generic_visit(node)
+
+    visit_Attribute = _visit_mutation
+    visit_Subscript = _visit_mutation
+
+    def visit_Expr(self, node):
+        # `lst.append(x)` / `df.drop(..., inplace=True)` may change the object in
+        # place; treat the base name as (re)defined, which only over-approximates
+        if _mutating_call(node.value, self.display):
+            base = node.value.func
+            while isinstance(base, (ast.Attribute, ast.Subscript, ast.Call)):
+                base = base.func if isinstance(base, ast.Call) else base.value
+            if isinstance(base, ast.Name):
+                self.stores.add(base.id)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.stores.add(alias.asname or alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name != '*':
+                self.stores.add(alias.asname or alias.name)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.stores.add(node.name)
+        self.generic_visit(node)
+
+    def _visit_arguments(self, args):
+        """Visit argument defaults (evaluated in the enclosing scope) and return the parameter names"""
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+        params = args.posonlyargs + args.args + args.kwonlyargs
+        params += [a for a in (args.vararg, args.kwarg) if a is not None]
+        return {a.arg for a in params}
+
+    def _visit_function(self, node):
+        self.stores.add(node.name)
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        params = self._visit_arguments(node.args)
+        free, global_stores = _free_names(node.body, params)
+        self.loads |= free
+        # `global z; z = 1` in the body defines z for later cells
+        self.stores |= global_stores
+
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+
+    def visit_Lambda(self, node):
+        params = self._visit_arguments(node.args)
+        self.loads |= _free_names([node.body], params)[0]
+
+    def visit_ClassDef(self, node):
+        self.stores.add(node.name)
+        for expr in node.decorator_list + node.bases + [k.value for k in node.keywords]:
+            self.visit(expr)
+        inner = _NameVisitor()
+        for stmt in node.body:
+            inner.visit(stmt)
+        self.loads |= inner.loads - inner.stores
+
+    def _visit_comprehension(self, node):
+        # Comprehension targets are local to the comprehension
+        inner = _NameVisitor()
+        inner.generic_visit(node)
+        self.loads |= inner.loads - inner.stores
+
+    visit_ListComp = _visit_comprehension
+    visit_SetComp = _visit_comprehension
+    visit_DictComp = _visit_comprehension
+    visit_GeneratorExp = _visit_comprehension
+
+
+def _mutating_call(node, display=False):
+    """
+    True if an expression statement is a method call that may change its base object.
+
+    A cell's trailing expression is shown rather than run for its effect (`df.head()`),
+    so there only an explicit inplace=True counts.
+    """
+    if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+        return False
+    if display:
+        return any(k.arg == 'inplace' and isinstance(k.value, ast.Constant) and k.value.value is True
+                   for k in node.keywords)
+    return True
+
+
+def _free_names(body, params):
+    """
+    Names a function body reads from the enclosing (global) scope.
+
+    Returns:
+        tuple: (free names, names the body assigns through a `global` statement)
+    """
+    inner = _NameVisitor()
+    declared_global = set()
+    for stmt in body:
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Global):
+                declared_global.update(node.names)
+        inner.visit(stmt)
+    local = (inner.stores - declared_global) | params
+    return inner.loads - local, inner.stores & declared_global
+
+
+@lru_cache(maxsize=512)
+def analyze_cell(code):
+    """
+    Find the global names a cell defines and the names it reads from earlier cells.
+
+    Args:
+        code (str): Source of the cell
+
+    Returns:
+        tuple: (defined: frozenset, used: frozenset). Cells that do not parse
+        (e.g. `!pip install`) define and use nothing.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return frozenset(), frozenset()
+
+    defined = set()
+    used = set()
+    for stmt in tree.body:
+        # The trailing expression is displayed, as in kernel._compile_cell
+        visitor = _NameVisitor(display=stmt is tree.body[-1] and isinstance(stmt, ast.Expr))
+        visitor.visit(stmt)
+        # A name read before this cell binds it must come from an earlier cell
+        used |= visitor.loads - defined
+        defined |= visitor.stores
+    return frozenset(defined), frozenset(used)
+
+
+def code_hash(code):
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+def build_dependencies(cells):
+    """
+    For each cell, the indices of the earlier cells it reads names from.
+
+    A name resolves to the closest cell above that defines it.
+    """
+    last_definer = {}
+    dependencies = []
+    for idx, cell in enumerate(cells):
+        defined, used = analyze_cell(cell['code'])
+        dependencies.append(sorted({last_definer[name] for name in used if name in last_definer}))
+        for name in defined:
+            last_definer[name] = idx
+    return dependencies
+
+
+def _fingerprint(salt, code, upstream):
+    digest = hashlib.sha256(salt.encode('utf-8'))
+    digest.update(code_hash(code).encode('utf-8'))
+    for fp in upstream:
+        digest.update((fp or '-').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def expected_fingerprints(cells, salt, dependencies=None):
+    """Fingerprints every cell would have if the notebook were run top to bottom"""
+    if dependencies is None:
+        dependencies = build_dependencies(cells)
+    expected = []
+    for idx, cell in enumerate(cells):
+        expected.append(_fingerprint(salt, cell['code'], [expected[j] for j in dependencies[idx]]))
+    return expected
+
+
+def run_fingerprint(cells, idx, salt, dependencies=None):
+    """
+    Fingerprint to store on a cell after it runs successfully.
+
+    It combines the cell's code hash with the stored fingerprints of the cells it
+    read from, i.e. the state actually present in the kernel.
+    """
+    if dependencies is None:
+        dependencies = build_dependencies(cells)
+    upstream = [cells[j].get('fingerprint') for j in dependencies[idx]]
+    return _fingerprint(salt, cells[idx]['code'], upstream)
+
+
+def stale_cells(cells, salt):
+    """
+    Indices of cells whose code or inputs changed since they last ran.
+
+    Args:
+        cells (list): Cell dicts; a successful run stores 'fingerprint' on the cell
+        salt (str): Identifies the kernel, so a restart makes every cell stale
+
+    Returns:
+        list: Stale cell indices in notebook order
+    """
+    expected = expected_fingerprints(cells, salt)
+    return [idx for idx, cell in enumerate(cells)
+            if cell['code'].strip() and cell.get('fingerprint') != expected[idx]]
@@ -0,0 +1,58 @@
+import hashlib
+from collections import OrderedDict
+
+
+class OutputStore:
+    """
+    Content-addressed store for rich cell outputs (figures, HTML) with a size cap.
+
+    Identical outputs are stored once, keyed by the SHA-256 of their bytes. When
+    the total size goes over max_bytes, the least recently used outputs are
+    evicted; cells that referenced them need to be re-run to show them again.
+    """
+
+    def __init__(self, max_bytes=50 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+
+    def add(self, mime, data):
+        """
+        Store an output and return its key.
+
+        Args:
+            mime (str): MIME type, e.g. 'image/png' or 'text/html'
+            data (bytes): Output content
+
+        Returns:
+            str: Content hash to keep in the cell record
+        """
+        key = hashlib.sha256(data).hexdigest()
+        if key in self._items:
+            self._items.move_to_end(key)
+            return key
+        self._items[key] = (mime, data)
+        self.total_bytes += len(data)
+        # Never evict the output that was just added
+        while self.total_bytes > self.max_bytes and len(self._items) > 1:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self.total_bytes -= len(evicted)
+        return key
+
+    def get(self, key):
+        """Return (mime, data) for a key, or None if it was evicted"""
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+
+    def retain(self, keys):
+        """Drop every output whose key is not in keys"""
+        for key in list(self._items):
+            if key not in keys:
+                _, data = self._items.pop(key)
+                self.total_bytes -= len(data)
+
+    def clear(self):
+        self._items.clear()
+        self.total_bytes = 0
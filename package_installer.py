@@ -0,0 +1,257 @@
+import os
+import re
+import sys
+import shlex
+import threading
+import subprocess
+import importlib
+from collections import deque
+from importlib import metadata
+
+
+# pip install options that take a value in the next token
+_OPTIONS_WITH_VALUE = {
+    '-r', '--requirement', '-c', '--constraint', '-e', '--editable', '-i', '--index-url',
+    '--extra-index-url', '-f', '--find-links', '-t', '--target', '--prefix', '--root',
+    '--src', '--platform', '--python-version', '--implementation', '--abi',
+    '--upgrade-strategy', '--progress-bar', '--trusted-host', '--cache-dir', '--proxy',
+    '--retries', '--timeout', '--exists-action', '--cert', '--client-cert', '--log',
+    '--global-option', '--config-settings', '-C', '--only-binary', '--no-binary',
+    '--report', '--root-user-action',
+}
+
+
+def parse_requirements(text):
+    """
+    Split user input such as "pandas numpy>=1.26, requests" into requirement strings.
+
+    pip options, and the values of options that take one, are dropped, since the
+    installer chooses its own index/wheelhouse flags.
+
+    Raises:
+        ValueError: If the input cannot be split (e.g. unbalanced quotes)
+    """
+    try:
+        tokens = shlex.split(text.replace(',', ' '))
+    except ValueError as e:
+        raise ValueError(f"Could not parse package list: {e}") from None
+    requirements = []
+    skip_value = False
+    for token in tokens:
+        if skip_value:
+            skip_value = False
+        elif token.startswith('-'):
+            skip_value = token in _OPTIONS_WITH_VALUE
+        else:
+            requirements.append(token)
+    return requirements
+
+
+def distribution_name(requirement):
+    """Project name of a requirement string, e.g. 'pandas[excel]>=2' -> 'pandas'"""
+    return re.split(r'[\s\[<>=!~;@]', requirement.strip(), maxsplit=1)[0]
+
+
+def _normalize(name):
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def _mentions(line, names):
+    """True if a pip output line refers to one of the (normalized) project names"""
+    line = _normalize(line)
+    return any(re.search(rf'(?<![a-z0-9-]){re.escape(name)}(?![a-z0-9])', line) for name in names)
+
+
+class InstallJob:
+    """One install request; progress is appended to log while it runs"""
+
+    def __init__(self, job_id, requirements, log_lines=200):
+        self.id = job_id
+        self.requirements = requirements
+        self.status = 'queued'
+        self.log = deque(maxlen=log_lines)
+        self.versions = {}
+        self.message = ''
+        self.names = {_normalize(distribution_name(r)) for r in requirements}
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def success(self):
+        return self.status == 'done'
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class InstallManager:
+    """
+    Installs packages with pip in a background thread, batching requests.
+
+    Everything requested while a pip run is in progress is installed together
+    in the next run, so the resolver runs once per batch. Wheels are kept in a
+    local wheelhouse: a batch is first installed from it with --no-index, which
+    takes no network and is fast for packages seen before; only when that fails
+    are missing wheels downloaded/built into the wheelhouse with `pip wheel`.
+    """
+
+    def __init__(self, wheelhouse):
+        self.wheelhouse = wheelhouse
+        os.makedirs(wheelhouse, exist_ok=True)
+        self._lock = threading.Lock()
+        self._queue = []
+        self._next_id = 0
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, requirements):
+        """
+        Queue requirements for installation.
+
+        If every requirement is a bare project name that is already installed, the
+        job finishes immediately without running pip.
+
+        Args:
+            requirements (list): Requirement strings, e.g. ['requests', 'numpy>=1.26']
+
+        Returns:
+            InstallJob: Poll .status/.log or call .wait() for the outcome
+        """
+        with self._lock:
+            self._next_id += 1
+            job = InstallJob(self._next_id, list(requirements))
+            if self._already_installed(job):
+                job.log.append("Requirement already satisfied: " + ", ".join(job.requirements))
+                self._finish(job, True)
+                return job
+            self._queue.append(job)
+        self._wakeup.set()
+        return job
+
+    @staticmethod
+    def _already_installed(job):
+        """True if every requirement is a bare name (no version, extras or URL) that is installed"""
+        importlib.invalidate_caches()
+        for requirement in job.requirements:
+            name = distribution_name(requirement)
+            if name != requirement.strip():
+                return False
+            try:
+                metadata.version(name)
+            except metadata.PackageNotFoundError:
+                return False
+        return True
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                batch, self._queue = self._queue, []
+                self._wakeup.clear()
+            if not batch:
+                continue
+            try:
+                self._install_batch(batch)
+            except Exception as e:
+                for job in batch:
+                    if not job.done:
+                        job.log.append(f"Installer error: {e!r}")
+            finally:
+                # Never leave a job unfinished, or its caller waits forever
+                for job in batch:
+                    if not job.done:
+                        self._finish(job, False)
+
+    def _pip(self, args, routes):
+        """
+        Run a pip command, streaming its output into job logs.
+
+        routes is a list of (job, names); a job with names set only gets the lines
+        that mention one of them, so batched jobs do not see each other's output.
+        """
+        command = [sys.executable, "-m", "pip"] + args
+        for job, names in routes:
+            if names is None:
+                job.log.append("$ " + " ".join(command[2:]))
+            else:
+                job.log.append(f"$ pip {args[0]} {' '.join(job.requirements)} (batched)")
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        for line in process.stdout:
+            line = line.rstrip()
+            for job, names in routes:
+                if names is None or _mentions(line, names):
+                    job.log.append(line)
+        return process.wait() == 0
+
+    def _install(self, requirements, routes):
+        """Install from the wheelhouse, fetching missing wheels into it first if needed"""
+        offline = ["install", "--no-index", "--find-links", self.wheelhouse] + requirements
+        try:
+            if self._pip(offline, routes):
+                return True
+            for job, _ in routes:
+                job.log.append("Not all wheels are in the wheelhouse; fetching them...")
+            return (
+                self._pip(["wheel", "--wheel-dir", self.wheelhouse,
+                           "--find-links", self.wheelhouse] + requirements, routes)
+                and self._pip(offline, routes)
+            )
+        except OSError as e:
+            for job, _ in routes:
+                job.log.append(f"Failed to start pip: {e}")
+            return False
+
+    def _install_batch(self, batch):
+        for job in batch:
+            job.status = 'running'
+
+        if len(batch) == 1:
+            job = batch[0]
+            results = {job: self._install(job.requirements, [(job, None)])}
+        else:
+            requirements = list(dict.fromkeys(r for job in batch for r in job.requirements))
+            for job in batch:
+                job.log.append(f"Installing together with {len(batch) - 1} other request(s)...")
+            if self._install(requirements, [(job, job.names) for job in batch]):
+                results = {job: True for job in batch}
+            else:
+                # One bad requirement must not fail everyone else's request
+                results = {}
+                for job in batch:
+                    job.log.append("Batch install failed; retrying this request on its own...")
+                    results[job] = self._install(job.requirements, [(job, None)])
+
+        importlib.invalidate_caches()
+        for job in batch:
+            self._finish(job, results[job])
+
+    @staticmethod
+    def _finish(job, success):
+        """Record installed versions, set the job's outcome and wake up its waiters"""
+        for requirement in job.requirements:
+            name = distribution_name(requirement)
+            try:
+                job.versions[name] = metadata.version(name)
+            except metadata.PackageNotFoundError:
+                pass
+        names = ", ".join(job.requirements)
+        if success:
+            job.status = 'done'
+            installed = ", ".join(f"{n}=={v}" for n, v in job.versions.items())
+            job.message = f"Successfully installed {installed or names}"
+        else:
+            job.status = 'failed'
+            job.message = f"Failed to install {names}"
+        job._done.set()